@@ -1,6 +1,8 @@
 import os
 import json
 import ast
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
 import pandas as pd
@@ -16,12 +18,25 @@ OUT_DIR = os.path.join("reports")
 FIG_DIR = os.path.join(OUT_DIR, "figures")
 REPORT_MD = os.path.join(OUT_DIR, "Market_Analysis_Report.md")
 SUMMARY_JSON = os.path.join(OUT_DIR, "summary.json")
+SWEEP_CSV = os.path.join(OUT_DIR, "detector_sweep.csv")
+SWEEP_HITS_CSV = os.path.join(OUT_DIR, "detector_sweep_hits.csv")
+
+SIDE_CODES = {"BUY": 1, "SELL": -1}
+MINUTE_NS = 60 * 10**9
+# realized-impact horizons; book snapshots in the sample arrive roughly every 18 minutes, so
+# shorter offsets would almost never see a new snapshot and come out NaN
+IMPACT_HORIZONS = ("5min", "30min", "60min")
 
 
 def ensure_dirs():
     os.makedirs(FIG_DIR, exist_ok=True)
 
 
+def _ns(index):
+    # DatetimeIndex -> sorted int64 epoch nanoseconds for searchsorted
+    return index.as_unit("ns").asi8
+
+
 def load_trades(path=DATA_TRADES):
     df = pd.read_csv(path)
     # Normalize column names
@@ -35,10 +50,23 @@ def load_trades(path=DATA_TRADES):
     for field in ["price", "size", "side"]:
         if field not in df.columns:
             raise ValueError(f"Trades CSV missing expected column: {field}")
-    # Clean side
-    df["side"] = df["side"].str.upper().str.strip()
-    df = df.dropna(subset=["timestamp", "price", "size"]).sort_values("timestamp")
-    return df
+    df = df.dropna(subset=["timestamp", "price", "size"]).sort_values("timestamp", kind="stable")
+    # Compact schema: int64 epoch ns, float32 price/size, int8 side (+1 buy, -1 sell, 0 unknown)
+    return pd.DataFrame({
+        "timestamp": _ns(pd.DatetimeIndex(df["timestamp"])),
+        "price": df["price"].to_numpy(dtype=np.float32),
+        "size": df["size"].to_numpy(dtype=np.float32),
+        "side": df["side"].str.upper().str.strip().map(SIDE_CODES).fillna(0).to_numpy(dtype=np.int8),
+    })
+
+
+def to_datetime_ns(ts):
+    # int64 epoch ns -> tz-aware timestamps for reporting
+    return pd.to_datetime(ts, unit="ns", utc=True)
+
+
+def bytes_per_trade(df):
+    return float(df.memory_usage(deep=True).sum() / len(df)) if len(df) else float("nan")
 
 
 def load_orderbooks(path=DATA_ORDERBOOKS):
@@ -58,17 +86,25 @@ def load_orderbooks(path=DATA_ORDERBOOKS):
 
 
 def resample_trades(df):
-    df["is_buy"] = (df["side"] == "BUY").astype(int)
-    df["is_sell"] = (df["side"] == "SELL").astype(int)
-    df = df.set_index("timestamp")
-    # 1-minute bars
-    bars = pd.DataFrame()
-    bars["price"] = df["price"].resample("1min").last()
-    bars["volume"] = df["size"].resample("1min").sum()
-    bars["buy_volume"] = (df["size"] * df["is_buy"]).resample("1min").sum()
-    bars["sell_volume"] = (df["size"] * df["is_sell"]).resample("1min").sum()
-    bars["trade_count"] = df["size"].resample("1min").count()
-    bars = bars.dropna(subset=["price"])  # drop leading NaNs
+    # 1-minute bars in one grouped pass: trades are time-sorted, so minute groups are contiguous
+    ts = df["timestamp"].to_numpy()
+    minute = ts // MINUTE_NS
+    new_group = np.empty(len(minute), dtype=bool)
+    new_group[:1] = True
+    np.not_equal(minute[1:], minute[:-1], out=new_group[1:])
+    starts = np.flatnonzero(new_group)
+    gid = np.cumsum(new_group) - 1
+    # one weighted bincount over (minute, side) cells yields sell/unknown/buy volume together
+    side_vol = np.bincount(gid * 3 + (df["side"].to_numpy() + 1), weights=df["size"].to_numpy(),
+                           minlength=3 * len(starts)).reshape(-1, 3)
+    bars = pd.DataFrame(index=pd.DatetimeIndex(to_datetime_ns(minute[starts] * MINUTE_NS), name="timestamp"))
+    # last trade of each minute (sliced so an empty frame gives empty bars, not index -1)
+    ends = np.r_[starts[1:], len(ts)][:len(starts)] - 1
+    bars["price"] = df["price"].to_numpy()[ends].astype(float)
+    bars["volume"] = side_vol.sum(axis=1)
+    bars["buy_volume"] = side_vol[:, 2]
+    bars["sell_volume"] = side_vol[:, 0]
+    bars["trade_count"] = np.diff(np.r_[starts, len(ts)])
     # Returns
     bars["return"] = bars["price"].pct_change()
     # Rolling stats
@@ -95,51 +131,158 @@ def detect_return_outliers(bars, z_thresh=3.0):
 
 def detect_microtrade_bursts(df, second_window='1s', size_thresh=0.01, min_trades=4):
     # group by seconds and price, count trades with very small size
-    dfg = df.copy()
-    dfg["sec"] = dfg.index.floor(second_window)
-    small = dfg[dfg["size"] <= size_thresh]
-    bursts = (small.groupby(["sec", "price"]).size().reset_index(name="n"))
-    bursts = bursts[bursts["n"] >= min_trades]
+    small = df["size"].to_numpy() <= size_thresh
+    step = pd.Timedelta(second_window).value
+    sec = df["timestamp"].to_numpy()[small] // step * step
+    bursts = (pd.DataFrame({"sec": sec, "price": df["price"].to_numpy()[small]})
+              .groupby(["sec", "price"]).size().reset_index(name="n"))
+    bursts = bursts[bursts["n"] >= min_trades].copy()
+    bursts["sec"] = to_datetime_ns(bursts["sec"])
     return bursts
 
 
 def detect_wash_trading(df, time_delta=pd.Timedelta(seconds=3)):
     # heuristic: back-to-back opposite-side trades at same price and similar size within 3 seconds
-    records = []
-    arr = df[["price", "size", "side"]].copy()
-    arr["ts"] = df.index
-    for i in range(len(arr) - 1):
-        a = arr.iloc[i]
-        b = arr.iloc[i+1]
-        if a["side"] != b["side"] and a["price"] == b["price"] and abs(a["size"] - b["size"]) / max(a["size"], b["size"]) < 0.05:
-            if (b["ts"] - a["ts"]) <= time_delta:
-                records.append({"t0": a["ts"], "t1": b["ts"], "price": a["price"], "size_a": a["size"], "size_b": b["size"], "side_a": a["side"], "side_b": b["side"]})
-    return pd.DataFrame(records)
+    ts = df["timestamp"].to_numpy()
+    price = df["price"].to_numpy()
+    size = df["size"].to_numpy()
+    side = df["side"].to_numpy()
+    a, b = slice(None, -1), slice(1, None)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similar = np.abs(size[a] - size[b]) / np.maximum(size[a], size[b]) < 0.05
+    hit = np.flatnonzero((side[a] != side[b]) & (price[a] == price[b]) & similar
+                         & (ts[b] - ts[a] <= time_delta.value))
+    return pd.DataFrame({
+        "t0": to_datetime_ns(ts[hit]), "t1": to_datetime_ns(ts[hit + 1]), "price": price[hit],
+        "size_a": size[hit], "size_b": size[hit + 1], "side_a": side[hit], "side_b": side[hit + 1]
+    }) if len(hit) else pd.DataFrame()
+
+
+def _pump_dump_mask(price, volume, ret_std, vol_mean, vol_std, win):
+    # window starts i where [i, i+win) runs up on high volume and [i+win, i+2*win) reverses
+    i = np.arange(max(len(price) - 2*win, 0))
+    end = i + win - 1
+    r_pre = price[end] / price[i] - 1
+    r_post = price[i + 2*win - 1] / price[i + win] - 1
+    cum_vol = np.r_[0.0, np.cumsum(volume)]
+    vol_pre = cum_vol[i + win] - cum_vol[i]
+    # thresholds relative to std; NaN stats never flag
+    with np.errstate(invalid="ignore"):
+        high_vol = vol_pre > (vol_mean[end] + 2 * vol_std[end])
+        hit = high_vol & (r_pre > 3 * ret_std[end]) & (r_post < -3 * ret_std[end])
+    return i[hit], r_pre[hit], r_post[hit], vol_pre[hit], cum_vol[i[hit] + 2*win] - cum_vol[i[hit] + win]
 
 
 def detect_pump_dump(bars, win=10):
     # pump: strong positive return over window & high volume; dump: followed by strong negative
-    res = []
-    for i in range(len(bars) - 2*win):
-        pre = bars.iloc[i:i+win]
-        post = bars.iloc[i+win:i+2*win]
-        r_pre = (pre["price"].iloc[-1] / pre["price"].iloc[0]) - 1
-        r_post = (post["price"].iloc[-1] / post["price"].iloc[0]) - 1
-        vol_pre = pre["volume"].sum()
-        vol_post = post["volume"].sum()
-        # thresholds relative to std
-        ret_std = bars["return"].rolling(win).std().iloc[i+win-1]
-        vol_mean = bars["volume"].rolling(win).mean().iloc[i+win-1]
-        vol_std = bars["volume"].rolling(win).std().iloc[i+win-1]
-        high_vol = vol_pre > (vol_mean + 2 * vol_std) if pd.notnull(vol_mean) and pd.notnull(vol_std) else False
-        if pd.notnull(ret_std) and high_vol:
-            if r_pre > 3 * ret_std and r_post < -3 * ret_std:
-                res.append({
-                    "start": pre.index[0], "mid": pre.index[-1], "end": post.index[-1],
-                    "r_pre": float(r_pre), "r_post": float(r_post),
-                    "vol_pre": float(vol_pre), "vol_post": float(vol_post)
-                })
-    return pd.DataFrame(res)
+    i, r_pre, r_post, vol_pre, vol_post = _pump_dump_mask(
+        bars["price"].to_numpy(dtype=float), bars["volume"].to_numpy(dtype=float),
+        bars["return"].rolling(win).std().to_numpy(),
+        bars["volume"].rolling(win).mean().to_numpy(),
+        bars["volume"].rolling(win).std().to_numpy(), win)
+    if not len(i):
+        return pd.DataFrame()
+    return pd.DataFrame({
+        "start": bars.index[i], "mid": bars.index[i + win - 1], "end": bars.index[i + 2*win - 1],
+        "r_pre": r_pre, "r_post": r_post, "vol_pre": vol_pre, "vol_post": vol_post
+    })
+
+
+def rolling_mean_std(x, windows):
+    # rolling mean/std (ddof=1, full windows only) for many windows from one set of prefix sums
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    center = x[valid].mean() if valid.any() else 0.0
+    xc = np.where(valid, x - center, 0.0)
+    s1 = np.r_[0.0, np.cumsum(xc)]
+    s2 = np.r_[0.0, np.cumsum(xc * xc)]
+    n_nan = np.r_[0, np.cumsum(~valid)]
+    out = {}
+    for w in windows:
+        mean = np.full(len(x), np.nan)
+        std = np.full(len(x), np.nan)
+        if w <= len(x):
+            end = np.arange(w, len(x) + 1)
+            a1 = s1[end] - s1[end - w]
+            a2 = s2[end] - s2[end - w]
+            full = (n_nan[end] - n_nan[end - w]) == 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                var = (a2 - a1 * a1 / w) / (w - 1)
+                # cancellation noise on flat windows -> exact zero, as pandas reports
+                var[var < 64 * np.finfo(float).eps * a2 / (w - 1)] = 0.0
+            mean[w - 1:] = np.where(full, a1 / w + center, np.nan)
+            std[w - 1:] = np.where(full, np.sqrt(var), np.nan)
+        out[w] = (mean, std)
+    return out
+
+
+DEFAULT_SWEEP_GRID = {
+    "z_thresh": [2.0, 2.5, 3.0, 3.5, 4.0],
+    "window": [15, 30, 60],
+    "win": [5, 10, 20],
+    "size_thresh": [0.001, 0.01, 0.1],
+    "min_trades": [3, 4, 6],
+}
+
+
+SWEEP_PARAMS = ["window", "z_thresh", "win", "size_thresh", "min_trades"]
+SWEEP_INT_PARAMS = ["window", "win", "min_trades"]
+
+
+def sweep_detectors(df, grid=None, second_window='1s', max_workers=None):
+    # evaluate every parameter combination against bars/rolling stats/burst groups built once;
+    # returns (counts: one row per combination, hits: one row per combination and flagged timestamp)
+    grid = {**DEFAULT_SWEEP_GRID, **(grid or {})}
+    _, bars = resample_trades(df)
+    idx = bars.index
+    price = bars["price"].to_numpy(dtype=float)
+    volume = bars["volume"].to_numpy(dtype=float)
+    ret = bars["return"].to_numpy(dtype=float)
+    windows = sorted(set(grid["window"]) | set(grid["win"]))
+    vol_stats = rolling_mean_std(volume, windows)
+    ret_stats = rolling_mean_std(ret, windows)
+
+    # micro-burst groups: (second, price) codes for every trade, counted per size threshold later
+    step = pd.Timedelta(second_window).value
+    sec = df["timestamp"].to_numpy() // step * step
+    codes = pd.DataFrame({"sec": sec, "price": df["price"].to_numpy()}).groupby(["sec", "price"]).ngroup().to_numpy()
+    group_sec = np.zeros(codes.max() + 1 if len(codes) else 0, dtype=np.int64)
+    group_sec[codes] = sec
+    size = df["size"].to_numpy()
+
+    def zscore_rows(window):
+        rows = []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vol_z = (volume - vol_stats[window][0]) / vol_stats[window][1]
+            ret_z = (ret - ret_stats[window][0]) / ret_stats[window][1]
+        for z in grid["z_thresh"]:
+            for name, hit in [("volume_spikes", vol_z > z), ("return_outliers", np.abs(ret_z) > z)]:
+                rows.append({"detector": name, "window": window, "z_thresh": z, "timestamps": idx[hit]})
+        return rows
+
+    def pump_dump_rows(win):
+        i = _pump_dump_mask(price, volume, ret_stats[win][1], *vol_stats[win], win)[0]
+        return [{"detector": "pump_dump", "win": win, "timestamps": idx[i]}]
+
+    def burst_rows(size_thresh):
+        counts = np.bincount(codes[size <= size_thresh], minlength=len(group_sec))
+        return [{"detector": "micro_bursts", "size_thresh": size_thresh, "min_trades": m,
+                 "timestamps": to_datetime_ns(group_sec[counts >= m])}
+                for m in grid["min_trades"]]
+
+    tasks = ([(zscore_rows, w) for w in grid["window"]] + [(pump_dump_rows, w) for w in grid["win"]]
+             + [(burst_rows, t) for t in grid["size_thresh"]])
+    # numpy releases the GIL in the heavy kernels, so threads share the intermediates without copies
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda task: task[0](task[1]), tasks))
+    rows = [row for rows in results for row in rows]
+    counts = pd.DataFrame(rows, columns=["detector"] + SWEEP_PARAMS)
+    # parameters a detector does not take stay missing without turning the integer ones into floats
+    counts[SWEEP_INT_PARAMS] = counts[SWEEP_INT_PARAMS].astype("Int64")
+    counts["count"] = [len(row["timestamps"]) for row in rows]
+    hits = counts.drop(columns="count").loc[counts.index.repeat(counts["count"])].reset_index(drop=True)
+    hits["timestamp"] = to_datetime_ns(np.concatenate([_ns(row["timestamps"]) for row in rows] + [np.empty(0, np.int64)]))
+    return counts, hits
 
 
 def parse_best_levels(ob):
@@ -194,6 +337,56 @@ def orderbook_metrics(df_ob, top_n=5):
     return met
 
 
+def join_trades_to_book(df, ob_met, horizons=IMPACT_HORIZONS):
+    # per-trade as-of join against the latest snapshot at or before each trade (bulk searchsorted)
+    ob_met = ob_met.sort_index()
+    t = df["timestamp"].to_numpy()
+    ob_t = _ns(ob_met.index)
+    # slot 0 is a NaN sentinel for trades that precede the first snapshot
+    bid_arr, ask_arr, mid_arr = (
+        np.concatenate([[np.nan], ob_met[c].to_numpy(dtype=float)]) for c in ["best_bid", "best_ask", "mid"]
+    )
+    snap_t = np.concatenate([[np.nan], ob_t.astype(float)])
+    pos = np.searchsorted(ob_t, t, side="right")
+
+    out = pd.DataFrame(index=pd.DatetimeIndex(to_datetime_ns(t), name="timestamp"))
+    price = df["price"].to_numpy(dtype=float)
+    sign = df["side"].to_numpy()
+    out["price"] = price
+    out["size"] = df["size"].to_numpy()
+    out["side"] = sign
+    out["best_bid"] = bid_arr[pos]
+    out["best_ask"] = ask_arr[pos]
+    mid = mid_arr[pos]
+    out["mid"] = mid
+    out["book_age_s"] = (t - snap_t[pos]) / 1e9
+    # reported side (+1/-1) vs quote rule (above mid = buyer-initiated)
+    quote_sign = np.sign(price - mid)
+    out["quote_sign"] = quote_sign
+    out["sign_consistent"] = (sign != 0) & (quote_sign == sign)
+    # trades without a reported side carry no direction: NaN, not 0
+    q = np.where(sign != 0, sign, np.nan)
+    # effective spread relative to prevailing mid: 2 * q * (p - m) / m
+    out["eff_spread"] = 2 * q * (price - mid) / mid
+    # realized price impact: signed move of the prevailing mid h after the trade; NaN unless a new
+    # snapshot arrived in (t, t+h] and the book still covers t+h (else the "future" mid is the stale one)
+    last_t = ob_t[-1] if len(ob_t) else np.iinfo(np.int64).min
+    for h in horizons:
+        th = t + pd.Timedelta(h).value
+        fpos = np.searchsorted(ob_t, th, side="right")
+        observed = (fpos > pos) & (th <= last_t)
+        out[f"impact_{h}"] = np.where(observed, q * (mid_arr[fpos] - mid) / mid, np.nan)
+    return out
+
+
+def detect_trades_outside_book(joined, tol=0.0, max_age=pd.Timedelta(minutes=5)):
+    # trades printed above the prevailing best ask or below the prevailing best bid
+    fresh = joined["book_age_s"] <= max_age.total_seconds()
+    above = joined["price"] > joined["best_ask"] * (1 + tol)
+    below = joined["price"] < joined["best_bid"] * (1 - tol)
+    return joined[fresh & (above | below)]
+
+
 def correlate_imbalance_future_return(ob_met, bars, horizon_min=5):
     # align mid with bars price, compute future returns vs current imbalance
     aligned = pd.merge_asof(ob_met.sort_index(), bars[["price"]].sort_index(), left_index=True, right_index=True, direction="nearest")
@@ -308,6 +501,9 @@ def write_report(summary):
     lines.append(f"- Spread behavior: Median spread is {summary['spread_median']:.6f}; outliers suggest transient liquidity withdrawal or aggressive step-function updates.")
     lines.append(f"- Top-5 imbalance: Mean imbalance {summary['imbalance_mean']:.3f}. Extreme imbalances may precede directional moves; correlation with future returns over 5 minutes: {summary['imbalance_future_corr']:.3f}.")
     lines.append(f"- Walls near best levels: {summary['num_walls']} snapshots show 10× size walls within top-5 levels, indicative of potential spoof-like signaling.")
+    lines.append(f"- Trades vs prevailing book: {summary['trades_outside_book']} trades printed outside the latest best bid/ask (snapshot ≤5 minutes old); median effective spread {summary['eff_spread_median']:.5f}; reported side agrees with the quote rule for {summary['side_quote_consistency']:.1%} of trades.")
+    impacts = "; ".join(f"{h}: {v['median']:.2e} over {v['observed']} trades" for h, v in summary["impact"].items())
+    lines.append(f"- Realized price impact (median signed mid move, only trades with a new snapshot within the horizon): {impacts}.")
     lines.append("")
 
     # Figures
@@ -325,6 +521,7 @@ def write_report(summary):
     lines.append("- Wash-trading detection relies on heuristic matching; exchange-level counterparty data is not available, so findings are indicative rather than definitive.")
     lines.append("- Pump/dump signals require windowed trend and reversal under elevated volume; thresholds are conservative to minimize false positives.")
     lines.append("- Orderbook parsing focuses on top-5 levels; deeper-book dynamics and cancellations are not directly observable from snapshots.")
+    lines.append("- Each trade is joined as-of to the latest preceding orderbook snapshot; sparse snapshots make the prevailing quote stale between updates.")
     lines.append("")
 
     with open(REPORT_MD, "w", encoding="utf-8") as f:
@@ -343,6 +540,8 @@ def main():
     pumpdump = detect_pump_dump(bars)
     ob_met = orderbook_metrics(orderbooks)
     corr, aligned = correlate_imbalance_future_return(ob_met, bars)
+    trade_book = join_trades_to_book(trades_df, ob_met)
+    outside_book = detect_trades_outside_book(trade_book)
 
     # Save figures
     fig_price = save_price_with_anomalies(bars, spikes, outs)
@@ -354,8 +553,9 @@ def main():
     summary = {
         "trades_rows": int(len(trades)),
         "orderbooks_rows": int(len(orderbooks)),
-        "trades_start": str(trades["timestamp"].min()),
-        "trades_end": str(trades["timestamp"].max()),
+        "trades_start": str(to_datetime_ns(trades["timestamp"].min())),
+        "trades_end": str(to_datetime_ns(trades["timestamp"].max())),
+        "trades_bytes_per_trade": bytes_per_trade(trades),
         "ob_start": str(orderbooks["timestamp"].min()),
         "ob_end": str(orderbooks["timestamp"].max()),
         "volume_spikes": int(len(spikes)),
@@ -367,6 +567,17 @@ def main():
         "imbalance_mean": float(ob_met["imbalance"].mean()) if not ob_met.empty else float("nan"),
         "num_walls": int((ob_met["ask_wall"] | ob_met["bid_wall"]).sum()) if not ob_met.empty else 0,
         "imbalance_future_corr": float(corr) if pd.notnull(corr) else float("nan"),
+        "trades_outside_book": int(len(outside_book)),
+        "eff_spread_median": float(trade_book["eff_spread"].median()) if trade_book["eff_spread"].notnull().any() else float("nan"),
+        "side_quote_consistency": float(trade_book.loc[trade_book["mid"].notnull(), "sign_consistent"].mean()) if trade_book["mid"].notnull().any() else float("nan"),
+        # per horizon: trades with an observed forward mid (the rest are NaN) and their median impact
+        "impact": {
+            h: {
+                "observed": int(trade_book[f"impact_{h}"].notnull().sum()),
+                "median": float(trade_book[f"impact_{h}"].median()) if trade_book[f"impact_{h}"].notnull().any() else float("nan"),
+            }
+            for h in IMPACT_HORIZONS
+        },
         "fig_price": fig_price,
         "fig_volume": fig_volume,
         "fig_ret_hist": fig_ret_hist,
@@ -382,5 +593,17 @@ def main():
     print(json.dumps(summary, indent=2))
 
 
+def sweep_main(grid=None):
+    ensure_dirs()
+    counts, hits = sweep_detectors(load_trades(), grid)
+    counts.to_csv(SWEEP_CSV, index=False)
+    hits.to_csv(SWEEP_HITS_CSV, index=False)
+    print(counts.to_string(index=False))
+    print("Saved to", SWEEP_CSV, "and", SWEEP_HITS_CSV)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if sys.argv[1:] == ["sweep"]:
+        sweep_main()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from replay_server import ReplayServer, SyntheticMarket, Faults, ROUTES
+
+# End-to-end throughput of the usdc_peg_dex_cex).py fetch pipelines against the local replay
+# server: requests issued, bytes transferred and wall time, total and per simulated day.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PEG_SCRIPT = os.path.join(HERE, 'usdc_peg_dex_cex).py')
+
+
+def load_pipeline(env):
+    # the script reads its endpoints from the environment at import time (and ETH_LOGS_* per call),
+    # so this changes os.environ for the caller; run() restores it afterwards
+    os.environ.update(env)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    spec = importlib.util.spec_from_file_location('usdc_peg_dex_cex', PEG_SCRIPT)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _bybit_archives(peg):
+    files = peg.list_symbol_files(peg.BYBIT_BASE, 'USDCUSDT')
+    rows, failed = 0, 0
+    for u in files:
+        try:
+            rows += len(peg.download_and_parse_gz(u))
+        except Exception:
+            failed += 1
+    if failed:
+        print(f'  {failed} of {len(files)} archives failed')
+    return rows
+
+
+def run(days=3, start='2025-07-01', latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_429=0.0,
+        fault_routes=ROUTES, swaps_per_block=0.3, trades_per_day=20000, max_block_range=None,
+        logs_sleep=None, seed=0):
+    start_dt = datetime.strptime(start, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    end_dt = start_dt + timedelta(days=days) - timedelta(seconds=1)
+    market = SyntheticMarket(start_dt, end_dt, swaps_per_block=swaps_per_block, trades_per_day=trades_per_day,
+                             max_block_range=max_block_range, seed=seed)
+    faults = Faults(latency_ms, jitter_ms, error_rate, rate_429, fault_routes, seed)
+    results = []
+    cwd = os.getcwd()
+    saved_env = dict(os.environ)
+    with tempfile.TemporaryDirectory(prefix='bench_fetch_') as workdir, \
+            ReplayServer(market=market, faults=faults) as srv:
+        env = srv.env()
+        if logs_sleep is not None:
+            env['ETH_LOGS_SLEEP'] = str(logs_sleep)
+        os.chdir(workdir)
+        try:
+            peg = load_pipeline(env)
+            peg.START, peg.END = start_dt, end_dt
+            peg.DATA_DIR = os.path.join(workdir, 'bybit_spot')
+            os.makedirs(peg.DATA_DIR, exist_ok=True)
+            stages = [
+                ('uniswap_swaps_rpc', lambda: len(peg.uniswap_swaps_rpc(peg.POOLS, start_dt, end_dt))),
+                ('bybit_archives', lambda: _bybit_archives(peg)),
+                ('bybit_klines', lambda: len(peg.fetch_bybit_klines(start_dt, end_dt))),
+            ]
+            for name, fn in stages:
+                srv.stats.reset()
+                t0 = time.perf_counter()
+                error = ''
+                try:
+                    n_rows = fn()
+                except Exception as e:
+                    n_rows, error = 0, f'{type(e).__name__}: {e}'
+                wall = time.perf_counter() - t0
+                snap = srv.stats.snapshot()
+                reqs = sum(r['requests'] for r in snap['routes'].values())
+                failed = sum(n for r in snap['routes'].values() for s, n in r['status'].items() if int(s) >= 400)
+                nbytes = sum(r['bytes_in'] + r['bytes_out'] for r in snap['routes'].values())
+                results.append({
+                    'stage': name, 'rows': n_rows, 'requests': reqs, 'failed_requests': failed,
+                    'bytes': nbytes, 'wall_s': round(wall, 3),
+                    'requests_per_day': round(reqs / days, 1), 'bytes_per_day': int(nbytes / days),
+                    'wall_s_per_day': round(wall / days, 3),
+                    'rpc_methods': json.dumps(snap['rpc_methods'], sort_keys=True), 'error': error,
+                })
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+    return pd.DataFrame(results)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark the DEX/CEX fetch pipelines against the replay server')
+    ap.add_argument('--days', type=int, default=3)
+    ap.add_argument('--start', default='2025-07-01')
+    ap.add_argument('--latency-ms', type=float, default=0.0)
+    ap.add_argument('--jitter-ms', type=float, default=0.0)
+    ap.add_argument('--error-rate', type=float, default=0.0)
+    ap.add_argument('--rate-429', type=float, default=0.0)
+    ap.add_argument('--fault-routes', default=','.join(ROUTES))
+    ap.add_argument('--swaps-per-block', type=float, default=0.3)
+    ap.add_argument('--trades-per-day', type=int, default=20000)
+    ap.add_argument('--max-block-range', type=int, default=None)
+    ap.add_argument('--logs-sleep', type=float, default=None, help='override ETH_LOGS_SLEEP between log chunks')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--out', default=None, help='also write the table to this CSV')
+    args = ap.parse_args()
+    res = run(args.days, args.start, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429,
+              args.fault_routes.split(','), args.swaps_per_block, args.trades_per_day, args.max_block_range,
+              args.logs_sleep, args.seed)
+    print(res.drop(columns=['rpc_methods']).to_string(index=False))
+    for _, r in res.iterrows():
+        print(f"{r['stage']} rpc methods: {r['rpc_methods']}")
+    if args.out:
+        res.to_csv(args.out, index=False)
+        print('Saved to', args.out)
+
+
+if __name__ == '__main__':
+    main()
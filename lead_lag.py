@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+def bucket_prices(time, price, weight=None, freq="1min"):
+    # time-bucketed price series: VWAP when weights are given, else the last print per bucket
+    df = pd.DataFrame({"bucket": pd.DatetimeIndex(time).floor(freq), "price": np.asarray(price, dtype=float)})
+    df = df.dropna(subset=["price"])
+    if weight is None:
+        return df.groupby("bucket")["price"].last()
+    w = np.asarray(weight, dtype=float)[df.index]
+    df["pw"] = df["price"] * w
+    df["w"] = w
+    g = df.groupby("bucket")[["pw", "w"]].sum()
+    return (g["pw"] / g["w"]).where(g["w"] > 0).dropna()
+
+
+def aligned_deviation(dex, cex, start, end, freq="1min", peg=1.0):
+    # both venues on one full-day grid, last price carried forward, as deviation from the peg
+    grid = pd.date_range(pd.Timestamp(start).floor("D"), pd.Timestamp(end).floor("D") + pd.Timedelta(days=1),
+                         freq=freq, inclusive="left")
+    out = pd.DataFrame(index=grid)
+    out["dex"] = dex.reindex(grid.union(dex.index)).ffill().reindex(grid) - peg
+    out["cex"] = cex.reindex(grid.union(cex.index)).ffill().reindex(grid) - peg
+    out["dex_obs"] = grid.isin(dex.index)
+    out["cex_obs"] = grid.isin(cex.index)
+    return out
+
+
+def xcorr_fft(x, y, max_lag):
+    # normalized cross-correlation c[k] = sum_t x[t] * y[t+k] along the last axis, k in [-max_lag, max_lag];
+    # positive k: moves in x show up in y k steps later (x leads)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.shape[-1]
+    x = x - x.mean(axis=-1, keepdims=True)
+    y = y - y.mean(axis=-1, keepdims=True)
+    # zero-pad so the circular correlation has no wrap-around for |k| < n
+    nfft = 1 << int(np.ceil(np.log2(2 * n - 1)))
+    c = np.fft.irfft(np.conj(np.fft.rfft(x, nfft)) * np.fft.rfft(y, nfft), nfft)
+    max_lag = min(max_lag, n - 1)
+    c = np.concatenate([c[..., nfft - max_lag:], c[..., :max_lag + 1]], axis=-1)
+    denom = np.sqrt((x * x).sum(axis=-1) * (y * y).sum(axis=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = c / denom[..., None]
+    return np.arange(-max_lag, max_lag + 1), corr
+
+
+def daily_lead_lag(dex, cex, start, end, freq="1min", max_lag=120, peg=1.0):
+    # per-day positive peak of the cross-correlation between DEX and CEX peg-deviation changes;
+    # all days go through one batched FFT (days x buckets-per-day)
+    step = pd.Timedelta(freq)
+    if step <= pd.Timedelta(0) or pd.Timedelta(days=1) % step != pd.Timedelta(0):
+        raise ValueError(f"freq {freq!r} must divide a day evenly (e.g. 1min, 5min, 15s)")
+    per_day = pd.Timedelta(days=1) // step
+    al = aligned_deviation(dex, cex, start, end, freq, peg)
+    days = al.index[::per_day].normalize()
+    # changes, not levels: a persistent depeg would otherwise dominate every lag
+    d_dex = al["dex"].diff().fillna(0.0).to_numpy().reshape(len(days), per_day)
+    d_cex = al["cex"].diff().fillna(0.0).to_numpy().reshape(len(days), per_day)
+    lags, corr = xcorr_fft(d_dex, d_cex, max_lag)
+    # same asset on both venues: the lead shows up as the strongest positive correlation
+    valid = np.isfinite(corr).any(axis=1)
+    peak = np.argmax(np.where(np.isfinite(corr), corr, -np.inf), axis=1)
+    rows = np.arange(len(days))
+    return pd.DataFrame({
+        "date": days,
+        # positive: DEX moves first and CEX follows this many buckets later
+        "peak_lag": np.where(valid, lags[peak], np.nan),
+        "peak_lag_seconds": np.where(valid, lags[peak] * step.total_seconds(), np.nan),
+        "peak_corr": np.where(valid, corr[rows, peak], np.nan),
+        "zero_lag_corr": corr[:, len(lags) // 2],
+        "dex_buckets": al["dex_obs"].to_numpy().reshape(len(days), per_day).sum(axis=1),
+        "cex_buckets": al["cex_obs"].to_numpy().reshape(len(days), per_day).sum(axis=1),
+    })
@@ -0,0 +1,215 @@
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Uniswap v3 LP + CEX short hedge backtest (see LP_Hedge_Memo.md).
+# Position in range [Pa, Pb] with liquidity L, price P (token1 per token0), s = sqrt(P) clipped to [sa, sb]:
+#   x = L * (1/s - 1/sb)   token0 held, also the local delta dV/dP
+#   y = L * (s - sa)       token1 held
+#   V = x * P + y
+# An infinite width is the V2 full range (sa = 0, 1/sb = 0), where V = 2 * L * sqrt(P) = 2 * sqrt(k * P).
+# The short starts at x(P0) and is reset to x(P) when |x - short| exceeds threshold * x(P0).
+# All configs (width x threshold x cost) and price paths are evaluated together as (configs, paths)
+# arrays; only the rebalance decision walks the swaps one step at a time.
+
+YEAR_SECONDS = 365.25 * 86400
+
+
+def swaps_to_market(swaps, dec0=6, dec1=6, fee_rate=0.0001):
+    # Decoded swap rows (uniswap_swaps_rpc) -> per-swap arrays in human units, token1 numeraire
+    swaps = swaps.sort_values(["time", "block"], kind="stable")
+    price = swaps["sqrt_price"].to_numpy(dtype=float) ** 2 * 10.0 ** (dec0 - dec1)
+    a0 = swaps["amount0"].to_numpy(dtype=float) / 10.0 ** dec0
+    a1 = swaps["amount1"].to_numpy(dtype=float) / 10.0 ** dec1
+    # the positive leg is what the trader paid in; the pool charges its fee on that leg
+    volume_in = np.where(a0 > 0, a0 * price, np.where(a1 > 0, a1, 0.0))
+    return {
+        "time": pd.DatetimeIndex(pd.to_datetime(swaps["time"], utc=True)).as_unit("ns").asi8,
+        "price": price,
+        "fee_value": fee_rate * volume_in,
+        # pool liquidity in the same units as a position's L computed from human amounts
+        "pool_liquidity": swaps["liquidity"].to_numpy(dtype=float) / 10.0 ** ((dec0 + dec1) / 2),
+    }
+
+
+def bootstrap_paths(market, n_paths, block=256, seed=0):
+    # Block bootstrap of the swap sequence: each path re-chains blocks of log returns together with
+    # the fee flow and liquidity that came with them. Path 0 is the historical sequence.
+    rng = np.random.default_rng(seed)
+    n = len(market["price"])
+    logret = np.diff(np.log(market["price"]), prepend=np.log(market["price"][0]))
+    idx = np.empty((n, n_paths), dtype=np.int64)
+    idx[:, 0] = np.arange(n)
+    n_blocks = -(-n // block)
+    for p in range(1, n_paths):
+        starts = rng.integers(0, max(n - block, 1), n_blocks)
+        idx[:, p] = (starts[:, None] + np.arange(block)).ravel()[:n].clip(max=n - 1)
+    r = logret[idx]
+    r[0] = 0.0
+    return {
+        "time": market["time"],
+        "price": market["price"][0] * np.exp(np.cumsum(r, axis=0)),
+        "fee_value": market["fee_value"][idx],
+        "pool_liquidity": market["pool_liquidity"][idx],
+    }
+
+
+def config_grid(widths, thresholds, costs_bps):
+    return pd.DataFrame(list(itertools.product(widths, thresholds, costs_bps)),
+                        columns=["width", "threshold", "cost_bps"])
+
+
+def _position(widths, p0, notional):
+    # sqrt range bounds and liquidity for each (width, path); inf width -> full range
+    w = widths[:, None]
+    full = ~np.isfinite(w)
+    sa = np.where(full, 0.0, np.sqrt(np.clip(p0 * (1 - np.where(full, 0.0, w)), 0.0, None)))
+    sb = np.where(full, np.inf, np.sqrt(p0 * (1 + np.where(full, 0.0, w))))
+    liquidity = notional / (2 * np.sqrt(p0) - p0 / sb - sa)
+    return sa, sb, liquidity
+
+
+def _amounts(s, sa, sb, liquidity):
+    sc = np.clip(s, sa, sb)
+    return liquidity * (1.0 / sc - 1.0 / sb), liquidity * (sc - sa)
+
+
+def backtest(market, configs, notional=100_000.0, funding_apr=0.0, chunk=None):
+    # market: swaps_to_market / bootstrap_paths output; price may be (T,) or (T, paths)
+    price = np.asarray(market["price"], dtype=float)
+    price = price[:, None] if price.ndim == 1 else price
+    if len(price) == 0:
+        raise ValueError("empty swap history: nothing to backtest")
+    fee_value = np.asarray(market["fee_value"], dtype=float).reshape(price.shape[0], -1)
+    pool_liq = np.asarray(market["pool_liquidity"], dtype=float).reshape(price.shape[0], -1)
+    t = np.asarray(market["time"], dtype=np.int64)
+    n_steps, n_paths = price.shape
+    n_cfg = len(configs)
+    widths = configs["width"].to_numpy(dtype=float)
+    if not (widths > 0).all():
+        raise ValueError(f"range widths must be > 0 (inf for full range), got {widths[~(widths > 0)].tolist()}")
+    thr = configs["threshold"].to_numpy(dtype=float)[:, None]
+    cost = configs["cost_bps"].to_numpy(dtype=float)[:, None] / 1e4
+
+    p0 = price[0][None, :]
+    sa, sb, liq = _position(widths, p0, notional)
+    x0, y0 = _amounts(np.sqrt(p0), sa, sb, liq)
+    band = thr * x0
+    # running state, all (configs, paths); the entry short is sized to the entry delta
+    hedge = x0.copy()
+    n_rebal = np.zeros((n_cfg, n_paths), dtype=np.int64)
+    costs = cost * x0 * p0
+    fees = np.zeros((n_cfg, n_paths))
+    hedge_pnl = np.zeros((n_cfg, n_paths))
+    funding = np.zeros((n_cfg, n_paths))
+    peak = np.zeros((n_cfg, n_paths))
+    max_dd = np.zeros((n_cfg, n_paths))
+    chunk = chunk or max(1, (1 << 21) // max(n_cfg * n_paths, 1))
+    prev_p, prev_t = price[0], t[0]
+    for c0 in range(0, n_steps, chunk):
+        c1 = min(c0 + chunk, n_steps)
+        p = price[c0:c1][:, None, :]
+        s = np.sqrt(p)
+        # LP side for the whole chunk at once: (steps, configs, paths)
+        x, y = _amounts(s, sa, sb, liq)
+        lp_value = x * p + y
+        # our share of each swap's fee while the price is inside the range
+        in_range = (s >= sa) & (s <= sb)
+        fee_step = fee_value[c0:c1][:, None, :] * liq / (liq + pool_liq[c0:c1][:, None, :]) * in_range
+        if c0 == 0:
+            fee_step[0] = 0.0  # entry swap
+        # hedge side: the short in force over each step is decided step by step
+        held = np.empty_like(x)
+        hits = np.empty(x.shape, dtype=bool)
+        drift = np.empty_like(hedge)
+        for i in range(c1 - c0):
+            held[i] = hedge
+            np.subtract(x[i], hedge, out=drift)
+            np.abs(drift, out=drift)
+            np.greater(drift, band, out=hits[i])
+            np.copyto(hedge, x[i], where=hits[i])
+        n_rebal += hits.sum(axis=0)
+        dp = np.diff(price[c0:c1], axis=0, prepend=prev_p[None])[:, None, :]
+        dt_years = np.diff(t[c0:c1], prepend=prev_t) / 1e9 / YEAR_SECONDS
+        hedge_step = -held * dp
+        funding_step = funding_apr * held * p * dt_years[:, None, None]
+        cost_step = cost * np.abs(x - held) * p * hits
+        # mark-to-market of the hedged position, for drawdown (one running sum of per-step P&L)
+        carried = fees + hedge_pnl + funding - costs
+        equity = lp_value - notional + carried + np.cumsum(fee_step + hedge_step + funding_step - cost_step, axis=0)
+        run_peak = np.maximum(peak[None], np.maximum.accumulate(equity, axis=0))
+        max_dd = np.maximum(max_dd, (run_peak - equity).max(axis=0))
+        peak = run_peak[-1]
+        fees = fees + fee_step.sum(axis=0)
+        hedge_pnl = hedge_pnl + hedge_step.sum(axis=0)
+        funding = funding + funding_step.sum(axis=0)
+        costs = costs + cost_step.sum(axis=0)
+        prev_p, prev_t = price[c1 - 1], t[c1 - 1]
+        last_lp, last_x = lp_value[-1], x[-1]
+    # passive hold of the entry amounts, for impermanent loss
+    hold_value = x0 * price[-1][None, :] + y0
+    res = pd.DataFrame({
+        "config": np.repeat(np.arange(n_cfg), n_paths),
+        "path": np.tile(np.arange(n_paths), n_cfg),
+        "width": np.repeat(widths, n_paths),
+        "threshold": np.repeat(thr[:, 0], n_paths),
+        "cost_bps": np.repeat(cost[:, 0] * 1e4, n_paths),
+        "entry_delta": x0.ravel(),
+        "final_delta": last_x.ravel(),
+        "final_hedge": hedge.ravel(),
+        "lp_value": last_lp.ravel(),
+        "impermanent_loss": (last_lp - hold_value).ravel(),
+        "fees": fees.ravel(),
+        "hedge_pnl": hedge_pnl.ravel(),
+        "funding": funding.ravel(),
+        "rebalance_cost": costs.ravel(),
+        "rebalances": n_rebal.ravel(),
+    })
+    res["total_pnl"] = res["lp_value"] - notional + res["fees"] + res["hedge_pnl"] + res["funding"] - res["rebalance_cost"]
+    res["max_drawdown"] = max_dd.ravel()
+    return res
+
+
+def _floats(s):
+    return [float(v) for v in s.split(",")]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hedged Uniswap v3 LP backtest over a decoded swap history")
+    ap.add_argument("swaps_csv", help="swap rows as written by usdc_peg_dex_cex).py")
+    ap.add_argument("--pool", default=None, help="pool address to use (default: first pool in the file)")
+    ap.add_argument("--dec0", type=int, default=6)
+    ap.add_argument("--dec1", type=int, default=6)
+    ap.add_argument("--fee-bps", type=float, default=1.0, help="pool fee tier in bps (0.01%% pool = 1)")
+    ap.add_argument("--notional", type=float, default=100_000.0)
+    ap.add_argument("--widths", default="0.001,0.005,0.01,0.05,0.1,inf", help="range half-widths as fractions of P0")
+    ap.add_argument("--thresholds", default="0,0.05,0.1,0.25,0.5", help="rebalance when |delta - short| > thr * entry delta")
+    ap.add_argument("--costs-bps", default="2,5", help="hedge trading cost per rebalance, bps of notional traded")
+    ap.add_argument("--funding-apr", type=float, default=0.0, help="funding received by the short, per year")
+    ap.add_argument("--paths", type=int, default=1, help="price paths: historical plus block-bootstrapped")
+    ap.add_argument("--block", type=int, default=256)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+    swaps = pd.read_csv(args.swaps_csv)
+    pool = args.pool or swaps["pool"].iloc[0]
+    market = swaps_to_market(swaps[swaps["pool"].str.lower() == pool.lower()], args.dec0, args.dec1, args.fee_bps / 1e4)
+    if len(market["price"]) == 0:
+        ap.error(f"no swaps for pool {pool} in {args.swaps_csv}")
+    if args.paths > 1:
+        market = bootstrap_paths(market, args.paths, args.block, args.seed)
+    configs = config_grid(_floats(args.widths), _floats(args.thresholds), _floats(args.costs_bps))
+    res = backtest(market, configs, args.notional, args.funding_apr)
+    summary = res.groupby(["width", "threshold", "cost_bps"])[
+        ["fees", "impermanent_loss", "hedge_pnl", "rebalance_cost", "rebalances", "total_pnl", "max_drawdown"]
+    ].mean().reset_index()
+    print(summary.to_string(index=False))
+    if args.out:
+        res.to_csv(args.out, index=False)
+        print("Saved to", args.out)
+
+
+if __name__ == "__main__":
+    main()
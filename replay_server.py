@@ -0,0 +1,494 @@
+import os
+import io
+import json
+import gzip
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the endpoints used by usdc_peg_dex_cex).py:
+#   POST /rpc                   JSON-RPC (web3_clientVersion, eth_chainId, eth_blockNumber,
+#                               eth_getBlockByNumber, eth_getLogs)
+#   GET  /public/...            Bybit public archive index pages and .csv.gz trade archives
+#   GET  /api/v5/market/kline   Bybit v5 minute klines
+# Responses come from a recording directory when present, otherwise from a deterministic
+# synthetic market. Latency, HTTP 500 errors and 429 rate limits can be injected.
+
+SWAP_TOPIC = '0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67'
+DEFAULT_POOLS = {'0x3416cf6c708da44db2624d63ea0aaef7113527c6': (6, 6)}
+ROUTES = ('rpc', 'public', 'api')
+
+
+def _word(v):
+    # ABI-encode one int/uint as a 32-byte two's complement word
+    return (v % (1 << 256)).to_bytes(32, 'big')
+
+
+def _index_page(links):
+    # minimal directory listing in the shape of public.bybit.com
+    return 'text/html', ''.join(f'<a href="{h}">{h}</a><br>\n' for h in links).encode()
+
+
+def _parse_day(s):
+    return datetime.strptime(s, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+class SyntheticMarket:
+    # Deterministic chain + Bybit data for [start, end]: same request -> same bytes, every run
+
+    def __init__(self, start, end, pools=None, swaps_per_block=0.3, trades_per_day=20000,
+                 block_time=12, max_block_range=None, seed=0):
+        self.start_ts = int(start.timestamp())
+        self.end_ts = int(end.timestamp())
+        self.pools = {p.lower(): d for p, d in (pools or DEFAULT_POOLS).items()}
+        self.swaps_per_block = swaps_per_block
+        self.trades_per_day = trades_per_day
+        self.block_time = block_time
+        self.max_block_range = max_block_range
+        self.seed = seed
+        # chain starts a day before the window and its head sits a day after it
+        self.genesis_ts = self.start_ts - 86400
+        self.latest = (self.end_ts + 86400 - self.genesis_ts) // block_time
+
+    def _rng(self, *key):
+        return random.Random(':'.join(str(k) for k in (self.seed,) + key))
+
+    def _peg(self, ts):
+        # slow drift around 1.0 with occasional short depegs
+        return 1.0 + 0.0008 * math.sin(ts / 7200.0) + (0.003 if (ts // 3600) % 97 == 0 else 0.0)
+
+    # --- JSON-RPC -------------------------------------------------------------------
+
+    def block(self, number):
+        n = self.latest if number in ('latest', 'pending', 'safe', 'finalized') else int(number, 16)
+        if n < 0 or n > self.latest:
+            return None
+        h = hashlib.sha256(f'{self.seed}:block:{n}'.encode()).hexdigest()
+        parent = hashlib.sha256(f'{self.seed}:block:{n - 1}'.encode()).hexdigest()
+        return {
+            'number': hex(n), 'hash': '0x' + h, 'parentHash': '0x' + parent,
+            'timestamp': hex(self.genesis_ts + n * self.block_time),
+            'nonce': '0x0000000000000000', 'sha3Uncles': '0x' + '0' * 64, 'logsBloom': '0x' + '0' * 512,
+            'transactionsRoot': '0x' + '0' * 64, 'stateRoot': '0x' + '0' * 64, 'receiptsRoot': '0x' + '0' * 64,
+            'miner': '0x' + '0' * 40, 'difficulty': '0x0', 'totalDifficulty': '0x0', 'extraData': '0x',
+            'size': '0x220', 'gasLimit': hex(30_000_000), 'gasUsed': '0x0', 'baseFeePerGas': '0x1',
+            'mixHash': '0x' + '0' * 64, 'transactions': [], 'uncles': [],
+        }
+
+    def logs(self, flt):
+        lo = int(flt.get('fromBlock', '0x0'), 16)
+        hi = min(int(flt.get('toBlock', hex(self.latest)), 16), self.latest)
+        if self.max_block_range and hi - lo + 1 > self.max_block_range:
+            raise ValueError(f'query exceeds max block range {self.max_block_range}')
+        addrs = flt.get('address') or list(self.pools)
+        addrs = [a.lower() for a in ([addrs] if isinstance(addrs, str) else addrs)]
+        topics = flt.get('topics') or [SWAP_TOPIC]
+        topic0 = topics[0] if isinstance(topics[0], str) else SWAP_TOPIC
+        topic0 = topic0 if topic0.startswith('0x') else '0x' + topic0
+        out = []
+        for n in range(lo, hi + 1):
+            ts = self.genesis_ts + n * self.block_time
+            for log_index, pool in enumerate(a for a in addrs if a in self.pools):
+                rng = self._rng('swap', n, pool)
+                if rng.random() >= self.swaps_per_block:
+                    continue
+                dec0, dec1 = self.pools[pool]
+                price = self._peg(ts) * (1.0 + rng.gauss(0.0, 2e-4))
+                raw = price * 10 ** (dec1 - dec0)
+                amount0 = rng.randint(10 ** dec0, 500_000 * 10 ** dec0) * rng.choice((1, -1))
+                amount1 = -int(amount0 * raw)
+                sqrt_x96 = int(math.sqrt(raw) * 2 ** 96)
+                liquidity = rng.randint(10 ** 12, 10 ** 14)
+                tick = math.floor(math.log(raw) / math.log(1.0001))
+                data = b''.join(_word(v) for v in (amount0, amount1, sqrt_x96, liquidity, tick))
+                out.append({
+                    'address': pool, 'topics': [topic0, '0x' + '0' * 64, '0x' + '0' * 64],
+                    'data': '0x' + data.hex(), 'blockNumber': hex(n),
+                    'blockHash': '0x' + hashlib.sha256(f'{self.seed}:block:{n}'.encode()).hexdigest(),
+                    'transactionHash': '0x' + hashlib.sha256(f'{self.seed}:tx:{n}:{pool}'.encode()).hexdigest(),
+                    'transactionIndex': hex(log_index), 'logIndex': hex(log_index), 'removed': False,
+                })
+        return out
+
+    def rpc(self, method, params):
+        # returns (result, error)
+        if method == 'web3_clientVersion':
+            return 'replay/1.0', None
+        if method in ('eth_chainId', 'net_version'):
+            return ('0x1' if method == 'eth_chainId' else '1'), None
+        if method == 'eth_blockNumber':
+            return hex(self.latest), None
+        if method == 'eth_getBlockByNumber':
+            return self.block(params[0]), None
+        if method == 'eth_getLogs':
+            try:
+                return self.logs(params[0]), None
+            except ValueError as e:
+                return None, {'code': -32005, 'message': str(e)}
+        return None, {'code': -32601, 'message': f'method {method} not supported'}
+
+    # --- Bybit ----------------------------------------------------------------------
+
+    def days(self):
+        d = self.start_ts - self.start_ts % 86400
+        while d <= self.end_ts:
+            yield d
+            d += 86400
+
+    def archive_name(self, day_ts):
+        return f"USDCUSDT{datetime.fromtimestamp(day_ts, tz=timezone.utc):%Y-%m-%d}.csv.gz"
+
+    def public(self, path):
+        # returns (status, content_type, body)
+        if path in ('', '/'):
+            return (200,) + _index_page(['spot/'])
+        if path == 'spot/':
+            return (200,) + _index_page(['public_trading/'])
+        if path == 'spot/public_trading/':
+            return (200,) + _index_page(['USDCUSDT/'])
+        if path == 'spot/public_trading/USDCUSDT/':
+            return (200,) + _index_page([self.archive_name(d) for d in self.days()])
+        for d in self.days():
+            if path == 'spot/public_trading/USDCUSDT/' + self.archive_name(d):
+                return 200, 'application/gzip', self.archive(d)
+        return 404, 'text/plain', b'not found'
+
+    def archive(self, day_ts):
+        rng = self._rng('archive', day_ts)
+        buf = io.StringIO()
+        buf.write('timestamp,symbol,side,size,price\n')
+        step = 86400.0 / max(self.trades_per_day, 1)
+        for i in range(self.trades_per_day):
+            ts = day_ts + i * step + rng.random() * step
+            price = round(self._peg(ts) * (1.0 + rng.gauss(0.0, 1e-4)), 4)
+            buf.write(f"{ts:.3f},USDCUSDT,{rng.choice(('Buy', 'Sell'))},{rng.uniform(1, 50000):.2f},{price}\n")
+        return gzip.compress(buf.getvalue().encode(), mtime=0)
+
+    def kline(self, query):
+        start = int(query.get('start', self.start_ts * 1000))
+        end = int(query.get('end', self.end_ts * 1000))
+        limit = min(int(query.get('limit', 200)), 1000)
+        first = max(start, self.start_ts * 1000)
+        first += (-first) % 60000
+        last = min(end, self.end_ts * 1000)
+        bars = []
+        for t in range(first, last + 1, 60000):
+            rng = self._rng('kline', t)
+            p = self._peg(t / 1000.0)
+            o, c = p * (1 + rng.gauss(0, 5e-5)), p * (1 + rng.gauss(0, 5e-5))
+            hi, lo = max(o, c) * (1 + abs(rng.gauss(0, 5e-5))), min(o, c) * (1 - abs(rng.gauss(0, 5e-5)))
+            vol = rng.uniform(1e3, 1e6)
+            bars.append([str(t), f'{o:.4f}', f'{hi:.4f}', f'{lo:.4f}', f'{c:.4f}', f'{vol:.2f}', f'{vol * c:.2f}'])
+            if len(bars) >= limit:
+                break
+        # Bybit v5 lists bars newest first
+        body = {'retCode': 0, 'retMsg': 'OK', 'result': {'category': 'spot', 'symbol': query.get('symbol', 'USDCUSDT'),
+                                                          'list': bars[::-1]}, 'time': int(time.time() * 1000)}
+        return 200, 'application/json', json.dumps(body).encode()
+
+
+class ReplayStore:
+    # Recorded responses on disk: <key>.json (status, content type) + <key>.bin (body)
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(route, method, path, query, body):
+        if route == 'rpc':
+            req = json.loads(body or b'{}')
+            ident = ['rpc', req.get('method'), req.get('params')]
+        else:
+            ident = [route, method, path, sorted(query.items())]
+        return hashlib.sha1(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        meta_path = os.path.join(self.root, key + '.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(self.root, key + '.bin'), 'rb') as f:
+            return meta['status'], meta['content_type'], f.read()
+
+    def put(self, key, status, content_type, body, note):
+        with open(os.path.join(self.root, key + '.bin'), 'wb') as f:
+            f.write(body)
+        with open(os.path.join(self.root, key + '.json'), 'w', encoding='utf-8') as f:
+            json.dump({'status': status, 'content_type': content_type, 'request': note}, f)
+
+
+class Faults:
+    # Injected per request, before the response is produced
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_429=0.0, routes=ROUTES, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.routes = set(routes)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self, route):
+        # returns (delay seconds, forced status or None)
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            u = self._rng.random()
+        if route not in self.routes:
+            return delay, None
+        if u < self.rate_429:
+            return delay, 429
+        if u < self.rate_429 + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+class Stats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {r: {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'status': {}} for r in ROUTES}
+            self.rpc_methods = {}
+
+    def add(self, route, status, bytes_in, bytes_out, rpc_method=None):
+        with self._lock:
+            r = self.routes[route]
+            r['requests'] += 1
+            r['bytes_in'] += bytes_in
+            r['bytes_out'] += bytes_out
+            r['status'][status] = r['status'].get(status, 0) + 1
+            if rpc_method:
+                self.rpc_methods[rpc_method] = self.rpc_methods.get(rpc_method, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({'routes': self.routes, 'rpc_methods': self.rpc_methods}))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes; Nagle + delayed ACK would add ~40ms per request
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        srv = self.server
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if url.path == '/__stats':
+            return self._send(200, 'application/json', json.dumps(srv.stats.snapshot()).encode())
+        if url.path == '/rpc':
+            route, sub = 'rpc', ''
+        elif url.path.startswith('/public/'):
+            route, sub = 'public', url.path[len('/public/'):]
+        elif url.path.startswith('/api/'):
+            route, sub = 'api', url.path[len('/api/'):]
+        else:
+            return self._send(404, 'text/plain', b'unknown route')
+        rpc_req = None
+        if route == 'rpc':
+            try:
+                rpc_req = json.loads(body or b'{}')
+            except ValueError:
+                return self._count(route, len(body), self._send(400, 'text/plain', b'bad json'))
+        delay, forced = srv.faults.draw(route)
+        if delay:
+            time.sleep(delay)
+        if forced == 429:
+            sent = self._send(429, 'text/plain', b'Too Many Requests', {'Retry-After': '1'})
+        elif forced:
+            sent = self._send(forced, 'text/plain', b'Internal Server Error')
+        else:
+            status, ctype, payload = srv.respond(route, self.command, sub, query, body, rpc_req)
+            sent = self._send(status, ctype, payload)
+        self._count(route, len(body), sent, rpc_req.get('method') if rpc_req else None)
+
+    def _count(self, route, bytes_in, sent, rpc_method=None):
+        status, bytes_out = sent
+        self.server.stats.add(route, status, bytes_in, bytes_out, rpc_method)
+
+    def _send(self, status, ctype, payload, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+        return status, len(payload)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    # Usage: with ReplayServer(market=SyntheticMarket(...)) as srv: ... srv.url ...
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, market=None, store=None, record=False,
+                 upstreams=None, faults=None):
+        super().__init__((host, port), _Handler)
+        self.market = market
+        self.store = ReplayStore(store) if store else None
+        self.record = record
+        self.upstreams = {'rpc': os.getenv('ETH_RPC_URL', ''), 'public': 'https://public.bybit.com/',
+                          'api': 'https://api.bybit.com/', **(upstreams or {})}
+        self.faults = faults or Faults()
+        self.stats = Stats()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self):
+        # environment for usdc_peg_dex_cex).py to talk to this server
+        return {'ETH_RPC_URL': self.url + '/rpc', 'BYBIT_BASE': self.url + '/public/',
+                'BYBIT_API_BASE': self.url + '/api/'}
+
+    def respond(self, route, method, path, query, body, rpc_req):
+        key = ReplayStore.key(route, method, path, query, body) if self.store else None
+        hit = self.store.get(key) if self.store else None
+        if hit is None and self.record and self.store:
+            if not self.upstreams.get(route):
+                return 502, 'text/plain', f'no upstream configured for route {route}'.encode()
+            try:
+                hit = self._forward(route, method, path, query, body)
+            except (urllib.error.URLError, OSError) as e:
+                # nothing to record: the caller sees a gateway error and may retry
+                return 502, 'text/plain', f'upstream unreachable: {e}'.encode()
+            if not self._recordable(route, *hit):
+                # transient upstream failures go back to the caller as-is and are never replayed
+                return hit
+            self.store.put(key, *hit, note={'route': route, 'path': path, 'query': query,
+                                            'rpc': [rpc_req.get('method'), rpc_req.get('params')] if rpc_req else None})
+        if hit is not None:
+            status, ctype, payload = hit
+            if rpc_req is not None and status == 200:
+                # recorded JSON-RPC bodies carry the recording's id; answer with the caller's
+                resp = json.loads(payload)
+                resp['id'] = rpc_req.get('id')
+                payload = json.dumps(resp).encode()
+            return status, ctype, payload
+        if self.market is None:
+            return 404, 'text/plain', b'no recording for request'
+        if route == 'rpc':
+            result, error = self.market.rpc(rpc_req.get('method'), rpc_req.get('params') or [])
+            resp = {'jsonrpc': '2.0', 'id': rpc_req.get('id')}
+            resp.update({'error': error} if error else {'result': result})
+            return 200, 'application/json', json.dumps(resp).encode()
+        if route == 'public':
+            return self.market.public(path)
+        if path == 'v5/market/kline':
+            return self.market.kline(query)
+        return 404, 'text/plain', b'not found'
+
+    @staticmethod
+    def _recordable(route, status, ctype, payload):
+        # only successful answers: 2xx, and no JSON-RPC error (range/rate limits arrive as HTTP 200)
+        # or non-zero Bybit retCode in the body
+        if not 200 <= status < 300:
+            return False
+        if route == 'public':
+            return True
+        try:
+            resp = json.loads(payload)
+        except ValueError:
+            return route != 'rpc'
+        if route == 'rpc':
+            return all(isinstance(r, dict) and 'error' not in r for r in (resp if isinstance(resp, list) else [resp]))
+        return not (isinstance(resp, dict) and resp.get('retCode', 0) != 0)
+
+    def _forward(self, route, method, path, query, body):
+        base = self.upstreams[route]
+        if route == 'rpc':
+            url = base
+        else:
+            url = base.rstrip('/') + '/' + path
+            if query:
+                url += '?' + urlencode(query)
+        req = urllib.request.Request(url, data=body if method == 'POST' else None, method=method,
+                                     headers={'Content-Type': 'application/json'} if route == 'rpc' else {})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as r:
+                return r.status, r.headers.get('Content-Type', 'application/octet-stream'), r.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Content-Type', 'text/plain'), e.read()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Replay server for the DEX/CEX fetch pipelines')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8545)
+    ap.add_argument('--start', default='2025-07-01', help='synthetic data start day (YYYY-MM-DD)')
+    ap.add_argument('--end', default='2025-07-03', help='synthetic data end day (YYYY-MM-DD, inclusive)')
+    ap.add_argument('--swaps-per-block', type=float, default=0.3)
+    ap.add_argument('--trades-per-day', type=int, default=20000)
+    ap.add_argument('--max-block-range', type=int, default=None, help='reject larger eth_getLogs ranges')
+    ap.add_argument('--no-synthetic', action='store_true', help='serve recordings only (404 otherwise)')
+    ap.add_argument('--store', default=None, help='recording directory')
+    ap.add_argument('--record', action='store_true', help='forward misses upstream and record them')
+    ap.add_argument('--rpc-upstream', default=os.getenv('ETH_RPC_URL', ''))
+    ap.add_argument('--latency-ms', type=float, default=0.0)
+    ap.add_argument('--jitter-ms', type=float, default=0.0)
+    ap.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    ap.add_argument('--rate-429', type=float, default=0.0, help='fraction of requests answered with HTTP 429')
+    ap.add_argument('--fault-routes', default=','.join(ROUTES))
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    market = None if args.no_synthetic else SyntheticMarket(
+        _parse_day(args.start), _parse_day(args.end).replace(hour=23, minute=59, second=59),
+        swaps_per_block=args.swaps_per_block, trades_per_day=args.trades_per_day,
+        max_block_range=args.max_block_range, seed=args.seed)
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429,
+                    args.fault_routes.split(','), args.seed)
+    srv = ReplayServer(args.host, args.port, market, args.store, args.record,
+                       {'rpc': args.rpc_upstream}, faults)
+    for k, v in srv.env().items():
+        print(f'{k}={v}')
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == '__main__':
+    main()
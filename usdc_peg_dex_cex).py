@@ -1,4 +1,5 @@
 import os
+import re
 import math
 import json
 import time
@@ -10,18 +11,33 @@ from bs4 import BeautifulSoup
 from datetime import datetime, timezone
 from web3 import Web3
 
+import lead_lag
+
 START = datetime(2025, 7, 1, 0, 0, 0, tzinfo=timezone.utc)
 END = datetime(2025, 9, 30, 23, 59, 59, tzinfo=timezone.utc)
 BAND_LOW = 0.999
 BAND_HIGH = 1.001
 POOL = '0x3416cf6c708da44db2624d63ea0aaef7113527c6'
+# Extra pools are scanned in the same log queries as POOL. Comma-separated entries, each either a known
+# address or address:TOKEN0/TOKEN1:DEC0/DEC1 (e.g. 0x...:DAI/USDC:18/6) so price and volume decode correctly
+EXTRA_POOLS = [p.strip() for p in os.getenv('EXTRA_POOLS', '').split(',') if p.strip()]
+POOLS = [POOL] + [p.split(':')[0].lower() for p in EXTRA_POOLS]
 # Graph removed: using RPC-only for Uniswap data
 POOL_TOKENS = {
     '0x3416cf6c708da44db2624d63ea0aaef7113527c6': ('USDC','USDT')
 }
-BYBIT_BASE = 'https://public.bybit.com/'
-BYBIT_SPOT_TRADES_ROOT = 'https://public.bybit.com/spot/public_trading/USDCUSDT/'
+# Endpoint overrides let the pipelines run against a local replay server (see replay_server.py)
+BYBIT_BASE = os.getenv('BYBIT_BASE', 'https://public.bybit.com/')
+BYBIT_SPOT_TRADES_ROOT = BYBIT_BASE + 'spot/public_trading/USDCUSDT/'
+BYBIT_KLINE_URL = os.getenv('BYBIT_API_BASE', 'https://api.bybit.com/').rstrip('/') + '/v5/market/kline'
 OUT_CSV = os.path.join('reports', 'DEX-CEX', 'usdc_peg_dex_cex.csv')
+OUT_POOLS_CSV = os.path.join('reports', 'DEX-CEX', 'usdc_peg_dex_pools.csv')
+OUT_LEADLAG_CSV = os.path.join('reports', 'DEX-CEX', 'usdc_peg_lead_lag.csv')
+# Decoded swap stream (input for lp_backtest.py)
+OUT_SWAPS_CSV = os.path.join('reports', 'DEX-CEX', 'uniswap_swaps.csv')
+# Lead-lag resolution (pandas offset) and max lag searched, in buckets
+LEADLAG_FREQ = os.getenv('LEADLAG_FREQ', '1min')
+LEADLAG_MAX_LAG = int(os.getenv('LEADLAG_MAX_LAG', '120'))
 DATA_DIR = os.path.join('data', 'bybit_spot')
 os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -44,6 +60,21 @@ POOL_DECIMALS = {
 POOL_TOKEN_ORDER = {
     '0x3416cf6c708da44db2624d63ea0aaef7113527c6': ('USDC','USDT')
 }
+for _spec in EXTRA_POOLS:
+    _parts = _spec.split(':')
+    if len(_parts) == 1:
+        # a bare address is only enough for pools whose decimals and token order are listed above
+        if _parts[0].lower() not in POOL_DECIMALS or _parts[0].lower() not in POOL_TOKEN_ORDER:
+            raise ValueError(f'EXTRA_POOLS entry {_spec!r} is not a known pool; '
+                             'give it as address:TOKEN0/TOKEN1:DEC0/DEC1')
+        continue
+    _tokens = tuple(t.strip().upper() for t in _parts[1].split('/'))
+    _decimals = _parts[2].split('/') if len(_parts) == 3 else []
+    if len(_tokens) != 2 or len(_decimals) != 2 or not all(d.strip().isdigit() for d in _decimals):
+        raise ValueError(f'EXTRA_POOLS entry {_spec!r} is not address:TOKEN0/TOKEN1:DEC0/DEC1')
+    _decimals = tuple(int(d) for d in _decimals)
+    POOL_TOKEN_ORDER[_parts[0].lower()] = _tokens
+    POOL_DECIMALS[_parts[0].lower()] = _decimals
 SWAP_EVENT_ABI = [{
     'anonymous': False,
     'inputs': [
@@ -97,9 +128,26 @@ def _find_block_by_timestamp(web3, target_ts):
     return res
 
 
-def uniswap_hourly_outside_band_rpc(pool_id, start_dt, end_dt):
+def _pool_list(pool_ids):
+    # Accept a single pool address or any iterable of them; dedupe, keep order
+    if isinstance(pool_ids, str):
+        pool_ids = [pool_ids]
+    return list(dict.fromkeys(p.lower() for p in pool_ids))
+
+
+SWAP_COLUMNS = ['pool','time','block','price','usdc_vol','amount0','amount1','sqrt_price','liquidity','tick']
+
+
+def uniswap_swaps_rpc(pool_ids, start_dt, end_dt):
+    # One eth_getLogs per block range for all pools; returns decoded swap-level rows
     if not ETH_RPC_URL:
         raise RuntimeError('ETH_RPC_URL not set for RPC fallback')
+    pools = _pool_list(pool_ids)
+    # decoding a pool with guessed decimals or token order would give silently wrong prices and volumes
+    unknown = [p for p in pools if p not in POOL_DECIMALS or p not in POOL_TOKEN_ORDER]
+    if unknown:
+        raise ValueError(f'No decimals/token order for pools {unknown}; '
+                         'pass them in EXTRA_POOLS as address:TOKEN0/TOKEN1:DEC0/DEC1')
     web3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
     connected_fn = getattr(web3, 'is_connected', None)
     ok = connected_fn() if callable(connected_fn) else web3.isConnected()
@@ -109,7 +157,7 @@ def uniswap_hourly_outside_band_rpc(pool_id, start_dt, end_dt):
     end_ts = int(end_dt.timestamp())
     from_block = _find_block_by_timestamp(web3, start_ts)
     to_block = _find_block_by_timestamp(web3, end_ts)
-    pool = Web3.to_checksum_address(pool_id)
+    addresses = [Web3.to_checksum_address(p) for p in pools]
     swap_topic = web3.keccak(text='Swap(address,address,int256,int256,uint160,uint128,int24)').hex()
     # Dynamic step with backoff to mitigate provider internal errors
     step = int(os.getenv('ETH_LOGS_STEP', '1000'))
@@ -118,15 +166,17 @@ def uniswap_hourly_outside_band_rpc(pool_id, start_dt, end_dt):
     backoff_sleep = 0.25
     sleep_between_chunks = float(os.getenv('ETH_LOGS_SLEEP', '0.05'))
     rows = []
-    dec0, dec1 = POOL_DECIMALS.get(pool_id.lower(), (6, 6))
-    token_order = POOL_TOKEN_ORDER.get(pool_id.lower(), ('USDC','USDT'))
+    # Per-pool decoding params: decimals and token order
+    pool_params = {p: (POOL_DECIMALS[p], POOL_TOKEN_ORDER[p]) for p in pools}
+    # Block timestamps are shared by every swap (and pool) in the same block
+    block_ts = {}
     from eth_abi import decode
     blk = from_block
     while blk <= to_block:
         end_blk = min(blk + step - 1, to_block)
         try:
             logs = web3.eth.get_logs({
-                'address': pool,
+                'address': addresses,
                 'fromBlock': blk,
                 'toBlock': end_blk,
                 'topics': [swap_topic]
@@ -151,31 +201,47 @@ def uniswap_hourly_outside_band_rpc(pool_id, start_dt, end_dt):
         if isinstance(logs, list) and len(logs) >= 10000:
             step = max(min_step, step // 2)
         for log in logs:
+            pool_id = str(log['address']).lower()
+            if pool_id not in pool_params:
+                continue
+            (dec0, dec1), token_order = pool_params[pool_id]
             try:
                 data_hex = log['data']
                 data_bytes = data_hex if isinstance(data_hex, bytes) else bytes.fromhex(data_hex[2:])
-                amount0, amount1, sqrtPriceX96, _liquidity, _tick = decode(['int256','int256','uint160','uint128','int24'], data_bytes)
+                amount0, amount1, sqrtPriceX96, liquidity, tick = decode(['int256','int256','uint160','uint128','int24'], data_bytes)
             except Exception:
                 continue
-            blk_obj = web3.eth.get_block(log['blockNumber'])
-            dt = datetime.fromtimestamp(blk_obj.timestamp, tz=timezone.utc)
-            hour = dt.replace(minute=0, second=0, microsecond=0)
-            price = (sqrtPriceX96 / (2**96))**2 * (10**(dec1 - dec0))
+            bn = log['blockNumber']
+            if bn not in block_ts:
+                block_ts[bn] = web3.eth.get_block(bn).timestamp
+            dt = datetime.fromtimestamp(block_ts[bn], tz=timezone.utc)
+            # token1 per token0; quote USDC in the counter token so the band applies to every pool
+            price = (sqrtPriceX96 / (2**96))**2 * (10**(dec0 - dec1))
             if token_order[0].upper() == 'USDC':
                 usdc_vol = abs(amount0) / (10**dec0)
             elif token_order[1].upper() == 'USDC':
                 usdc_vol = abs(amount1) / (10**dec1)
+                price = 1.0 / price if price else float('nan')
             else:
                 usdc_vol = float('nan')
-            outside = (price < BAND_LOW) or (price > BAND_HIGH)
-            rows.append({'hour': hour, 'price': price, 'usdc_vol': usdc_vol, 'outside': outside})
+            rows.append({
+                'pool': pool_id, 'time': dt, 'block': bn, 'price': price, 'usdc_vol': usdc_vol,
+                # raw token units; sqrt_price is sqrtPriceX96 / 2**96 (raw token1 per raw token0)
+                'amount0': float(amount0), 'amount1': float(amount1),
+                'sqrt_price': sqrtPriceX96 / (2**96), 'liquidity': float(liquidity), 'tick': int(tick)
+            })
         # Polite sleep between chunks to avoid rate limits
         time.sleep(sleep_between_chunks)
         blk = end_blk + 1
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return pd.DataFrame(columns=['time','uniswap_volume','uniswap_min_price','uniswap_max_price'])
-    g = df[df['outside']].groupby('hour').agg(
+    return pd.DataFrame(rows, columns=SWAP_COLUMNS)
+
+
+def swaps_hourly_outside_band(swaps):
+    # Per-pool hourly outside-band volume and price range from swap-level rows
+    if swaps.empty:
+        return pd.DataFrame(columns=['pool','time','uniswap_volume','uniswap_min_price','uniswap_max_price'])
+    outside = swaps[(swaps['price'] < BAND_LOW) | (swaps['price'] > BAND_HIGH)]
+    g = outside.assign(hour=outside['time'].dt.floor('h')).groupby(['pool','hour']).agg(
         uniswap_volume=('usdc_vol','sum'),
         uniswap_min_price=('price','min'),
         uniswap_max_price=('price','max')
@@ -183,6 +249,22 @@ def uniswap_hourly_outside_band_rpc(pool_id, start_dt, end_dt):
     return g
 
 
+def uniswap_hourly_outside_band_rpc(pool_ids, start_dt, end_dt):
+    # Per-pool hourly outside-band rows for all pools from a single log scan
+    return swaps_hourly_outside_band(uniswap_swaps_rpc(pool_ids, start_dt, end_dt))
+
+
+def aggregate_pools(per_pool):
+    # Collapse per-pool hourly rows into one hourly outside-band table across pools
+    if per_pool.empty:
+        return pd.DataFrame(columns=['time','uniswap_volume','uniswap_min_price','uniswap_max_price'])
+    return per_pool.groupby('time').agg(
+        uniswap_volume=('uniswap_volume','sum'),
+        uniswap_min_price=('uniswap_min_price','min'),
+        uniswap_max_price=('uniswap_max_price','max')
+    ).reset_index()
+
+
 def list_public_dirs(base_url=BYBIT_BASE):
     r = requests.get(base_url, timeout=30)
     r.raise_for_status()
@@ -207,6 +289,19 @@ def find_spot_trade_root():
     return BYBIT_BASE + candidates[0] if candidates else None
 
 
+def _file_date(fn):
+    # Archive date from names like USDCUSDT2025-07-01.csv.gz, USDCUSDT_trades_2025-07-01.csv.gz or ..._20250701...
+    m = re.search(r'(\d{4}-\d{2}-\d{2}|\d{8})', fn)
+    if not m:
+        return None
+    for fmt in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(m.group(1), fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return None
+
+
 def list_symbol_files(root_url, symbol='USDCUSDT'):
     # Prefer explicit spot trades root if available
     try:
@@ -218,20 +313,7 @@ def list_symbol_files(root_url, symbol='USDCUSDT'):
             for fn in links:
                 if not fn.endswith('.csv.gz'):
                     continue
-                name = fn.lower()
-                # match common patterns
-                # USDCUSDT-YYYY-MM-DD.csv.gz or USDCUSDT_trades_YYYY-MM-DD.csv.gz
-                parts = name.replace('-', '_').split('_')
-                dt_candidate = None
-                for i in range(len(parts)):
-                    for fmt in ('%Y-%m-%d', '%Y%m%d'):
-                        try:
-                            dt_candidate = datetime.strptime(parts[i][:10], fmt).replace(tzinfo=timezone.utc)
-                            break
-                        except Exception:
-                            pass
-                    if dt_candidate:
-                        break
+                dt_candidate = _file_date(fn)
                 if dt_candidate and START <= dt_candidate <= END:
                     files.append(BYBIT_SPOT_TRADES_ROOT + fn)
             return sorted(set(files))
@@ -251,15 +333,9 @@ def list_symbol_files(root_url, symbol='USDCUSDT'):
         soup2 = BeautifulSoup(r2.text, 'html.parser')
         f2 = [a.get('href') for a in soup2.find_all('a') if a.get('href') and a.get('href').endswith('.csv.gz')]
         for fn in f2:
-            for fmt in ('%Y-%m-%d', '%Y%m%d'):
-                for part in fn.split('_'):
-                    try:
-                        dt = datetime.strptime(part[:10], fmt).replace(tzinfo=timezone.utc)
-                        if START <= dt <= END:
-                            files.append(url + fn)
-                        break
-                    except Exception:
-                        pass
+            dt = _file_date(fn)
+            if dt and START <= dt <= END:
+                files.append(url + fn)
     return sorted(set(files))
 
 
@@ -277,103 +353,115 @@ def download_and_parse_gz(url):
     return df
 
 
-def bybit_hourly_outside_band():
-    # Try explicit spot trades root first
-    files = []
+def normalize_bybit_trades(df):
+    # Bybit trade archive -> DataFrame(time, price, size); None if required columns are missing
+    cols = {c.lower(): c for c in df.columns}
+    price_col = cols.get('price')
+    size_col = cols.get('size') or cols.get('qty') or cols.get('quantity')
+    time_col = cols.get('time') or cols.get('timestamp')
+    if not (price_col and size_col and time_col):
+        return None
+    ts = pd.to_numeric(df[time_col], errors='coerce')
+    # archives mix seconds (float) and milliseconds
+    ts_sec = ts.where(~(ts > 1e12), ts / 1000.0)
+    return pd.DataFrame({
+        'time': pd.to_datetime(ts_sec, unit='s', utc=True),
+        'price': pd.to_numeric(df[price_col], errors='coerce'),
+        'size': pd.to_numeric(df[size_col], errors='coerce'),
+    }).dropna(subset=['time'])
+
+
+def fetch_bybit_klines(start_dt, end_dt):
+    # USDCUSDT spot 1-minute klines: DataFrame(time, open, high, low, close, volume)
+    res_rows = []
+    start_ms = int(start_dt.timestamp() * 1000)
+    end_ms = int(end_dt.timestamp() * 1000)
+    cursor = start_ms
+    while cursor < end_ms:
+        params = {
+            'category': 'spot',
+            'symbol': 'USDCUSDT',
+            'interval': '1',
+            'start': cursor,
+            'end': min(cursor + 1000*60*1000, end_ms),  # up to ~1000 minutes
+            'limit': 1000
+        }
+        r = requests.get(BYBIT_KLINE_URL, params=params, timeout=30)
+        r.raise_for_status()
+        resp = r.json()
+        # Handle Bybit API-level errors (HTTP 200 but non-zero retCode)
+        ret_code = resp.get('retCode')
+        if ret_code and ret_code != 0:
+            print('Bybit kline error:', ret_code, resp.get('retMsg'))
+            break
+        data = resp.get('result', {}).get('list', [])
+        if not data:
+            break
+        for row in data:
+            # row format: [start, open, high, low, close, volume, turnover]
+            ts = int(row[0])//1000
+            res_rows.append({
+                'time': datetime.fromtimestamp(ts, tz=timezone.utc),
+                'open': float(row[1]), 'high': float(row[2]), 'low': float(row[3]),
+                'close': float(row[4]), 'volume': float(row[5])
+            })
+        # Bybit returns newest first; advance past the latest bar in the page
+        cursor = max(int(row[0]) for row in data) + 60*1000
+    return pd.DataFrame(res_rows, columns=['time','open','high','low','close','volume'])
+
+
+def load_bybit():
+    # One pass over the CEX data shared by the hourly table and the lead-lag series: trades from the
+    # archives as DataFrame(time, price, size), else minute klines (time, open, high, low, close, volume)
     try:
         files = list_symbol_files(BYBIT_BASE, 'USDCUSDT')
     except Exception as e:
         print('Bybit list files failed:', e)
         files = []
-    rows = []
+    parts = []
     for u in files:
         try:
-            df = download_and_parse_gz(u)
-            cols = {c.lower(): c for c in df.columns}
-            price_col = cols.get('price')
-            size_col = cols.get('size') or cols.get('qty') or cols.get('quantity')
-            symbol_col = cols.get('symbol')
-            time_col = cols.get('time') or cols.get('timestamp')
-            if not (price_col and size_col and time_col):
-                continue
-            ts_series = pd.to_numeric(df[time_col], errors='coerce')
-            ts_sec = ts_series.apply(lambda x: x/1000.0 if x and x > 1e12 else x)
-            dt = ts_sec.apply(lambda x: datetime.fromtimestamp(x, tz=timezone.utc))
-            df['_hour'] = dt.apply(lambda d: d.replace(minute=0, second=0, microsecond=0))
-            df['_price'] = pd.to_numeric(df[price_col], errors='coerce')
-            df['_size'] = pd.to_numeric(df[size_col], errors='coerce')
-            outside = df[(df['_price'] < BAND_LOW) | (df['_price'] > BAND_HIGH)]
-            g = outside.groupby('_hour').agg(
-                bybit_volume=('_size','sum'),
-                bybit_min_price=('_price','min'),
-                bybit_max_price=('_price','max')
-            ).reset_index().rename(columns={'_hour':'time'})
-            rows.append(g)
+            df = normalize_bybit_trades(download_and_parse_gz(u))
+            if df is not None:
+                parts.append(df)
         except Exception as e:
             print('Error parsing', u, e)
-    if rows:
-        out = pd.concat(rows).groupby('time').agg(
-            bybit_volume=('bybit_volume','sum'),
-            bybit_min_price=('bybit_min_price','min'),
-            bybit_max_price=('bybit_max_price','max'),
-        ).reset_index()
-        return out
+    if parts:
+        return pd.concat(parts, ignore_index=True)
     # Fallback: approximate with minute klines if no trade archives
     try:
-        def fetch_kline(start_dt, end_dt):
-            res_rows = []
-            start_ms = int(start_dt.timestamp() * 1000)
-            end_ms = int(end_dt.timestamp() * 1000)
-            cursor = start_ms
-            while cursor < end_ms:
-                params = {
-                    'category': 'spot',
-                    'symbol': 'USDCUSDT',
-                    'interval': '1',
-                    'start': cursor,
-                    'end': min(cursor + 1000*60*1000, end_ms),  # up to ~1000 minutes
-                    'limit': 1000
-                }
-                # Fix URL: remove stray backticks and spaces
-                r = requests.get('https://api.bybit.com/v5/market/kline', params=params, timeout=30)
-                r.raise_for_status()
-                resp = r.json()
-                # Handle Bybit API-level errors (HTTP 200 but non-zero retCode)
-                ret_code = resp.get('retCode')
-                if ret_code and ret_code != 0:
-                    print('Bybit kline error:', ret_code, resp.get('retMsg'))
-                    break
-                data = resp.get('result', {}).get('list', [])
-                if not data:
-                    break
-                for row in data:
-                    # row format: [start, open, high, low, close, volume, turnover]
-                    ts = int(row[0])//1000
-                    dtm = datetime.fromtimestamp(ts, tz=timezone.utc)
-                    price_high = float(row[2])
-                    price_low = float(row[3])
-                    vol = float(row[5])
-                    outside = (price_high > BAND_HIGH) or (price_low < BAND_LOW)
-                    if outside:
-                        hour = dtm.replace(minute=0, second=0, microsecond=0)
-                        res_rows.append({'time': hour, 'bybit_volume': vol, 'bybit_min_price': price_low, 'bybit_max_price': price_high})
-                cursor = int(data[-1][0]) + 60*1000
-            if not res_rows:
-                return pd.DataFrame(columns=['time','bybit_volume','bybit_min_price','bybit_max_price'])
-            return pd.DataFrame(res_rows).groupby('time').agg(
-                bybit_volume=('bybit_volume','sum'),
-                bybit_min_price=('bybit_min_price','min'),
-                bybit_max_price=('bybit_max_price','max')
-            ).reset_index()
-        return fetch_kline(START, END)
+        return fetch_bybit_klines(START, END)
     except Exception as e:
         print('Bybit kline fallback failed:', e)
+        return pd.DataFrame(columns=['time','open','high','low','close','volume'])
+
+
+def bybit_hourly_outside_band(cex):
+    # cex: load_bybit output; klines use the bar high/low against the band
+    if 'close' in cex.columns:
+        outside = cex[(cex['high'] > BAND_HIGH) | (cex['low'] < BAND_LOW)]
+        agg = dict(bybit_volume=('volume','sum'), bybit_min_price=('low','min'), bybit_max_price=('high','max'))
+    else:
+        outside = cex[(cex['price'] < BAND_LOW) | (cex['price'] > BAND_HIGH)]
+        agg = dict(bybit_volume=('size','sum'), bybit_min_price=('price','min'), bybit_max_price=('price','max'))
+    if outside.empty:
         return pd.DataFrame(columns=['time','bybit_volume','bybit_min_price','bybit_max_price'])
+    return outside.assign(hour=outside['time'].dt.floor('h')).groupby('hour').agg(
+        **agg
+    ).reset_index().rename(columns={'hour':'time'})
 
 
-def uniswap_hourly_outside_band(pool_id, start_dt, end_dt):
-    # RPC-only path for Uniswap v3 swaps
-    return uniswap_hourly_outside_band_rpc(pool_id, start_dt, end_dt)
+def bybit_minute_prices(cex, freq=None):
+    # CEX price series for lead-lag from load_bybit output: trade VWAP per bucket, else kline closes
+    freq = freq or LEADLAG_FREQ
+    if 'close' in cex.columns:
+        return lead_lag.bucket_prices(cex['time'], cex['close'], freq=freq)
+    return lead_lag.bucket_prices(cex['time'], cex['price'], cex['size'], freq)
+
+
+def uniswap_hourly_outside_band(pool_ids, start_dt, end_dt):
+    # RPC-only path for Uniswap v3 swaps; aggregated across pools
+    return aggregate_pools(uniswap_hourly_outside_band_rpc(pool_ids, start_dt, end_dt))
 
 
 def main():
@@ -401,15 +489,18 @@ def main():
         except Exception as e:
             print('Env band parse failed:', e)
     try:
-        dex_df = uniswap_hourly_outside_band(POOL, START, END)
+        dex_swaps = uniswap_swaps_rpc(POOLS, START, END)
     except Exception as e:
         print('Uniswap fetch failed:', e)
-        dex_df = pd.DataFrame(columns=['time','uniswap_volume','uniswap_min_price','uniswap_max_price'])
-    try:
-        cex_df = bybit_hourly_outside_band()
-    except Exception as e:
-        print('Bybit fetch failed:', e)
-        cex_df = pd.DataFrame(columns=['time','bybit_volume','bybit_min_price','bybit_max_price'])
+        dex_swaps = pd.DataFrame(columns=SWAP_COLUMNS)
+    if not dex_swaps.empty:
+        dex_swaps.to_csv(OUT_SWAPS_CSV, index=False)
+        print('Saved to', OUT_SWAPS_CSV)
+    dex_pools_df = swaps_hourly_outside_band(dex_swaps)
+    dex_df = aggregate_pools(dex_pools_df)
+    # Bybit archives (or klines) are fetched and parsed once for both the hourly table and the lead-lag
+    cex = load_bybit()
+    cex_df = bybit_hourly_outside_band(cex)
     all_hours = pd.DataFrame({'time': pd.date_range(START.replace(minute=0, second=0, microsecond=0), END.replace(minute=0, second=0, microsecond=0), freq='H', tz=timezone.utc)})
     res = all_hours.merge(dex_df, on='time', how='left').merge(cex_df, on='time', how='left')
     for c in ['uniswap_volume','bybit_volume']:
@@ -417,6 +508,22 @@ def main():
             res[c] = res[c].fillna(0.0)
     res[['time','uniswap_volume','bybit_volume','uniswap_min_price','uniswap_max_price','bybit_min_price','bybit_max_price']].to_csv(OUT_CSV, index=False)
     print('Saved to', OUT_CSV)
+    dex_pools_df.to_csv(OUT_POOLS_CSV, index=False)
+    print('Saved to', OUT_POOLS_CSV)
+    # Lead-lag between venues from the same swaps plus Bybit trades (klines as fallback)
+    cex_px = bybit_minute_prices(cex, LEADLAG_FREQ)
+    if dex_swaps.empty or cex_px.empty:
+        print('Lead-lag skipped: missing DEX or CEX prices')
+        return
+    # one pool only: a last-price series mixing pools would jump between them
+    pool_swaps = dex_swaps[dex_swaps['pool'] == POOL]
+    if pool_swaps.empty:
+        print('Lead-lag skipped: no swaps for', POOL)
+        return
+    dex_px = lead_lag.bucket_prices(pool_swaps['time'], pool_swaps['price'], freq=LEADLAG_FREQ)
+    ll = lead_lag.daily_lead_lag(dex_px, cex_px, START, END, LEADLAG_FREQ, LEADLAG_MAX_LAG)
+    ll.to_csv(OUT_LEADLAG_CSV, index=False)
+    print('Saved to', OUT_LEADLAG_CSV)
 
 
 if __name__ == '__main__':